@@ -1,23 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Response, BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import BinaryIO, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, VerificationError, InvalidHashError
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+from joblib import Parallel, delayed, parallel_config
 import json
+import gzip
 import io
+import zlib
+import orjson
+import warnings
+import hashlib
+import threading
+import time
+from functools import lru_cache
+from cachetools import TTLCache
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 
 ROOT_DIR = Path(__file__).parent
@@ -25,7 +42,13 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=100,
+    minPoolSize=10,
+    maxIdleTimeMS=30000,
+    serverSelectionTimeoutMS=3000
+)
 db = client[os.environ['DB_NAME']]
 
 # JWT Configuration
@@ -33,8 +56,64 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# Outlier detection: anomaly scores saturate well below sklearn's default of 100 trees
+ISOLATION_FOREST_ESTIMATORS = 64
+ISOLATION_FOREST_MAX_SAMPLES = 256
+# Below this many rows thread dispatch costs more than it saves
+ISOLATION_FOREST_PARALLEL_MIN_ROWS = 20_000
+
+# Dataset analysis is CPU-bound, so it runs in worker processes rather than on
+# the event loop. Workers are spawned (not forked) because the parent already
+# runs the event loop and Mongo monitor threads.
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1))
+# Threads each worker may use for its own parallel steps, so concurrent
+# analyses together stay within the machine's cores
+ANALYSIS_THREADS = max(1, (os.cpu_count() or 1) // ANALYSIS_WORKERS)
+
+def _new_analysis_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=ANALYSIS_WORKERS,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+_analysis_pool = _new_analysis_pool()
+
+# Password hashing configuration (Argon2id; tune per host hardware)
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', '65536'))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', '1'))
+
+password_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+
+# Short-lived cache of successful login verifications: sha256(email:password) -> stored hash
+LOGIN_CACHE_TTL_SECONDS = 30
+_login_cache = TTLCache(maxsize=10_000, ttl=LOGIN_CACHE_TTL_SECONDS)
+_login_cache_lock = threading.Lock()
+
+# Authenticated users by id, so most requests skip the Mongo lookup. Only
+# touched from the event loop thread, so no lock is needed.
+USER_CACHE_TTL_SECONDS = 60
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+
+# Insights still pending after this long were lost (e.g. a restart dropped the
+# background task) and are reported as failed so clients stop waiting
+INSIGHTS_TIMEOUT_SECONDS = 300
+
+# Files accepted in one batch upload; each may be up to the 50MB single-file limit
+MAX_BATCH_FILES = 10
+
 # Create the main app without a prefix
-app = FastAPI(title="DataPulse Analytics Platform", version="1.0.0")
+# orjson serializes the large nested analysis payloads far faster than the
+# stdlib encoder, and emits NaN statistics as null instead of failing
+app = FastAPI(
+    title="DataPulse Analytics Platform",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -82,6 +161,7 @@ class DatasetAnalysis(BaseModel):
     missing_data: dict
     outliers: dict
     ai_insights: Optional[str] = None
+    insights_status: str = "completed"  # pending, completed, failed
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # Helper Functions
@@ -93,27 +173,152 @@ def create_jwt_token(user_data: dict) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+@lru_cache(maxsize=4096)
+def _decode_jwt_cached(token: str, now_bucket: int) -> dict:
+    # A signed token never changes, so a successful decode can be reused.
+    # now_bucket rotates entries out once a minute; failures are not cached.
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+
 def verify_jwt_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        payload = _decode_jwt_cached(token, int(time.time()) // 60)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # A cached payload may outlive the token by up to a minute
+    if payload['exp'] <= time.time():
+        raise HTTPException(status_code=401, detail="Token expired")
+    return payload
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     payload = verify_jwt_token(credentials.credentials)
-    user = await db.users.find_one({"id": payload["user_id"]})
-    if not user:
+    user = _user_cache.get(payload["user_id"])
+    if user is not None:
+        return user
+    user_doc = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0, "password": 0})
+    if not user_doc:
         raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
-
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    user = User.model_construct(**user_doc)
+    _user_cache[user.id] = user
+    return user
+
+def _verify_password_sync(password: str, hashed_password: str) -> bool:
+    # Accounts created before the Argon2 switch still carry bcrypt hashes;
+    # only those need encoding, Argon2 verifies the stored text directly
+    if hashed_password.startswith(('$2a$', '$2b$', '$2y$')):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    try:
+        return password_hasher.verify(hashed_password, password)
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False
+
+async def hash_password(password: str) -> str:
+    # KDF work is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(password_hasher.hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await asyncio.to_thread(_verify_password_sync, password, hashed_password)
+
+def _numeric_stats(numeric_values: np.ndarray, nan_mask: np.ndarray):
+    """Compute count/mean/std/min/max for each column of a float64 matrix.
+
+    Quartiles are deliberately omitted: the dashboard never shows them and
+    each one costs a selection pass per column. Returns the statistics keyed
+    like describe() plus the column-centered matrix (missing cells zeroed)
+    and column standard deviations, so callers can reuse them instead of
+    rescanning the data.
+    """
+    counts = len(numeric_values) - np.count_nonzero(nan_mask, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # One full-size working buffer, centered in place; missing cells stay zero
+        centered = numeric_values.copy()
+        np.copyto(centered, 0.0, where=nan_mask)
+        means = centered.sum(axis=0) / counts
+        centered -= means
+        np.copyto(centered, 0.0, where=nan_mask)
+        stds = np.sqrt(np.einsum('ij,ij->j', centered, centered) / (counts - 1))
+        # fmin/fmax skip NaN; columns with no values stay NaN
+        mins = np.fmin.reduce(numeric_values, axis=0, initial=np.nan)
+        maxs = np.fmax.reduce(numeric_values, axis=0, initial=np.nan)
+    stds[counts < 2] = np.nan
+    
+    stats = {
+        'count': counts.astype(np.float64),
+        'mean': means,
+        'std': stds,
+        'min': mins,
+        'max': maxs
+    }
+    return stats, centered, stds
+
+def _complete_rows(numeric_values: np.ndarray, nan_mask: np.ndarray, centered: np.ndarray, stds: np.ndarray):
+    """Return the centered matrix and stds restricted to rows without missing values"""
+    complete = ~nan_mask.any(axis=1)
+    if complete.all():
+        # Nothing to drop: reuse the buffers computed for the summary stats
+        return centered, stds
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        complete_values = numeric_values[complete]
+        complete_centered = complete_values - complete_values.mean(axis=0)
+        complete_stds = complete_centered.std(axis=0, ddof=1)
+    return complete_centered, complete_stds
+
+def _correlations(centered: np.ndarray, stds: np.ndarray, nan_mask: np.ndarray) -> np.ndarray:
+    """Pairwise Pearson correlations, matching DataFrame.corr().
+
+    Each pair of columns uses the rows where both are present, so a sparse
+    or empty column does not shrink or blank out the other pairs.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if not nan_mask.any():
+            covariance = (centered.T @ centered) / (len(centered) - 1)
+            return np.clip(covariance / np.outer(stds, stds), -1.0, 1.0)
+        # Missing cells are already zeroed in centered, so sums over the rows
+        # a pair shares reduce to products with the presence mask.
+        # pair_sums[i, j] sums column i over the rows where column j is present.
+        present = (~nan_mask).astype(np.float64)
+        pair_counts = present.T @ present
+        pair_sums = centered.T @ present
+        pair_squares = np.square(centered).T @ present
+        covariance = centered.T @ centered - pair_sums * pair_sums.T / pair_counts
+        variances = pair_squares - pair_sums * pair_sums / pair_counts
+        correlations = covariance / np.sqrt(variances * variances.T)
+        correlations[pair_counts < 2] = np.nan
+        return np.clip(correlations, -1.0, 1.0)
+
+def _detect_outliers(complete_centered: np.ndarray, complete_stds: np.ndarray) -> dict:
+    outliers = {}
+    if len(complete_centered) > 10:  # Need enough data points
+        # Standardize from the already-centered matrix; constant columns keep
+        # a unit scale, matching StandardScaler. The trees work in float32
+        # internally, so emit float32 directly instead of letting sklearn copy.
+        scale = np.where((complete_stds > 0) & np.isfinite(complete_stds), complete_stds, 1.0)
+        scaled_data = np.divide(complete_centered, scale, dtype=np.float32)
+        
+        n_jobs = ANALYSIS_THREADS if len(scaled_data) >= ISOLATION_FOREST_PARALLEL_MIN_ROWS else 1
+        isolation_forest = IsolationForest(
+            n_estimators=ISOLATION_FOREST_ESTIMATORS,
+            max_samples=min(ISOLATION_FOREST_MAX_SAMPLES, len(scaled_data)),
+            contamination=0.1,
+            n_jobs=n_jobs,
+            random_state=42
+        )
+        # Tree building and scoring release the GIL, so threads avoid process spawn overhead
+        with parallel_config(backend='threading', n_jobs=n_jobs):
+            outlier_predictions = isolation_forest.fit_predict(scaled_data)
+        
+        # Get indices of outliers
+        outlier_indices = np.flatnonzero(outlier_predictions == -1)
+        outlier_count = len(outlier_indices)
+        outliers['total_outliers'] = outlier_count
+        outliers['outlier_percentage'] = (outlier_count / len(complete_centered)) * 100
+        outliers['outlier_rows'] = outlier_indices[:10].tolist()  # Limit to first 10
+    return outliers
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+def _top_values(column: pd.Series) -> dict:
+    return column.value_counts().head().to_dict()
 
 def analyze_dataframe(df: pd.DataFrame) -> dict:
     """Analyze dataframe and return insights"""
@@ -125,24 +330,42 @@ def analyze_dataframe(df: pd.DataFrame) -> dict:
     categorical_columns = df.select_dtypes(include=['object']).columns.tolist()
     
     if numeric_columns:
-        summary_stats['numeric'] = df[numeric_columns].describe().to_dict()
+        # Materialize the numeric block once and thread it through every step
+        numeric_values = df[numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        nan_mask = np.isnan(numeric_values)
+        stat_values, centered, stds = _numeric_stats(numeric_values, nan_mask)
+        # Keyed like DataFrame.describe().to_dict(), without the quartiles
+        summary_stats['numeric'] = {
+            col: {stat: float(values[i]) for stat, values in stat_values.items()}
+            for i, col in enumerate(numeric_columns)
+        }
+        if len(numeric_columns) > 1:
+            # Outlier detection needs rows without missing values
+            complete_centered, complete_stds = _complete_rows(numeric_values, nan_mask, centered, stds)
     if categorical_columns:
-        summary_stats['categorical'] = {col: df[col].value_counts().head().to_dict() for col in categorical_columns}
+        # Hashing releases the GIL, so per-column counts overlap on threads
+        top_values = Parallel(n_jobs=ANALYSIS_THREADS, backend='threading')(
+            delayed(_top_values)(df[col]) for col in categorical_columns
+        )
+        summary_stats['categorical'] = dict(zip(categorical_columns, top_values))
     
     analysis['summary_stats'] = summary_stats
     
     # Correlations (only for numeric columns)
     if len(numeric_columns) > 1:
-        correlations = df[numeric_columns].corr()
+        correlations = _correlations(centered, stds, nan_mask)
         # Convert to serializable format
-        analysis['correlations'] = correlations.to_dict()
+        analysis['correlations'] = pd.DataFrame(
+            correlations, index=numeric_columns, columns=numeric_columns
+        ).to_dict()
     else:
         analysis['correlations'] = {}
     
     # Missing data analysis
+    missing_counts = df.isnull().sum()
     missing_data = {
-        'total_missing': df.isnull().sum().to_dict(),
-        'percentage_missing': (df.isnull().sum() / len(df) * 100).to_dict()
+        'total_missing': missing_counts.to_dict(),
+        'percentage_missing': (missing_counts / len(df) * 100).to_dict()
     }
     analysis['missing_data'] = missing_data
     
@@ -150,22 +373,7 @@ def analyze_dataframe(df: pd.DataFrame) -> dict:
     outliers = {}
     if len(numeric_columns) >= 2:
         try:
-            # Prepare data for outlier detection
-            outlier_data = df[numeric_columns].dropna()
-            if len(outlier_data) > 10:  # Need enough data points
-                scaler = StandardScaler()
-                scaled_data = scaler.fit_transform(outlier_data)
-                
-                isolation_forest = IsolationForest(contamination=0.1, random_state=42)
-                outlier_predictions = isolation_forest.fit_predict(scaled_data)
-                
-                outlier_count = sum(1 for pred in outlier_predictions if pred == -1)
-                outliers['total_outliers'] = outlier_count
-                outliers['outlier_percentage'] = (outlier_count / len(outlier_data)) * 100
-                
-                # Get indices of outliers
-                outlier_indices = [i for i, pred in enumerate(outlier_predictions) if pred == -1]
-                outliers['outlier_rows'] = outlier_indices[:10]  # Limit to first 10
+            outliers = _detect_outliers(complete_centered, complete_stds)
         except Exception as e:
             outliers['error'] = f"Could not perform outlier detection: {str(e)}"
     
@@ -173,6 +381,50 @@ def analyze_dataframe(df: pd.DataFrame) -> dict:
     
     return analysis
 
+class SizeLimitedReader(io.RawIOBase):
+    """Read-only stream wrapper that rejects the upload once more than limit bytes are read"""
+
+    def __init__(self, source: BinaryIO, limit: int):
+        self._source = source
+        self._limit = limit
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = self._source.readinto(buffer)
+        self.bytes_read += count
+        if self.bytes_read > self._limit:
+            raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
+        return count
+
+def parse_upload(filename: str, source: BinaryIO) -> pd.DataFrame:
+    """Parse an uploaded CSV or JSON file into a dataframe"""
+    # Parse straight from the binary stream; Arrow's multi-threaded CSV reader
+    # also skips the full-payload UTF-8 decode into a Python str
+    if filename.endswith('.csv'):
+        return pd.read_csv(source, engine='pyarrow')
+    return pd.read_json(source)
+
+# Same options ORJSONResponse uses, so stored payloads match live responses
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def build_analysis_document(analysis: DatasetAnalysis) -> dict:
+    """Build the stored analysis record around its pre-serialized API payload.
+
+    Analyses are immutable once written, so they are encoded to JSON once
+    here instead of being re-validated and re-encoded on every read.
+    """
+    payload = orjson.dumps(analysis.model_dump(), option=ORJSON_OPTIONS)
+    return {
+        'id': analysis.id,
+        'dataset_id': analysis.dataset_id,
+        'created_at': analysis.created_at,
+        'insights_status': analysis.insights_status,
+        'payload_gz': gzip.compress(payload, compresslevel=6)
+    }
+
 async def generate_ai_insights(analysis_data: dict, df_info: dict) -> str:
     """Generate AI insights using LLM"""
     try:
@@ -216,6 +468,36 @@ async def generate_ai_insights(analysis_data: dict, df_info: dict) -> str:
     except Exception as e:
         return f"AI insights generation failed: {str(e)}"
 
+async def finish_ai_insights(analysis: DatasetAnalysis, analysis_data: dict, df_info: dict):
+    """Generate AI insights for a stored analysis and update it in place"""
+    try:
+        analysis.ai_insights = await generate_ai_insights(analysis_data, df_info)
+        analysis.insights_status = "completed"
+        # The stored payload is pre-serialized, so rebuild it rather than patching one field
+        await db.analyses.update_one({"id": analysis.id}, {"$set": build_analysis_document(analysis)})
+    except Exception:
+        logger.exception("Failed to finish AI insights for analysis %s", analysis.id)
+        analysis.ai_insights = None
+        analysis.insights_status = "failed"
+        try:
+            await db.analyses.update_one({"id": analysis.id}, {"$set": build_analysis_document(analysis)})
+        except Exception:
+            # Left pending; reads time it out after INSIGHTS_TIMEOUT_SECONDS
+            logger.exception("Failed to mark AI insights as failed for analysis %s", analysis.id)
+
+async def expire_stale_insights(analysis_json: bytes) -> bytes:
+    """Mark pending insights older than the timeout as failed; returns the payload to serve"""
+    analysis = DatasetAnalysis(**orjson.loads(analysis_json))
+    if datetime.now(timezone.utc) - analysis.created_at < timedelta(seconds=INSIGHTS_TIMEOUT_SECONDS):
+        return analysis_json
+    analysis.insights_status = "failed"
+    # Only if still pending, so a late background task's result is kept
+    await db.analyses.update_one(
+        {"id": analysis.id, "insights_status": "pending"},
+        {"$set": build_analysis_document(analysis)}
+    )
+    return orjson.dumps(analysis.model_dump(), option=ORJSON_OPTIONS)
+
 # Authentication Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register_user(user_data: UserCreate):
@@ -225,7 +507,7 @@ async def register_user(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="User already exists with this email")
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email
@@ -253,9 +535,17 @@ async def login_user(login_data: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Verify password
-    if not verify_password(login_data.password, user['password']):
-        raise HTTPException(status_code=401, detail="Invalid email or password")
+    # Verify password, skipping the KDF for a recently verified identical login.
+    # Only successes are cached, and the entry is tied to the stored hash so a
+    # password change invalidates it.
+    cache_key = hashlib.sha256(f"{login_data.email}:{login_data.password}".encode('utf-8')).digest()
+    with _login_cache_lock:
+        cached_hash = _login_cache.get(cache_key)
+    if cached_hash != user['password']:
+        if not await verify_password(login_data.password, user['password']):
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+        with _login_cache_lock:
+            _login_cache[cache_key] = user['password']
     
     # Create JWT token
     user_obj = User(**user)
@@ -272,37 +562,69 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Dataset Routes
-@api_router.post("/datasets/upload")
-async def upload_dataset(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
-):
+async def run_analysis(df: pd.DataFrame) -> dict:
+    """Run analyze_dataframe in the worker pool, replacing the pool if a worker died"""
+    global _analysis_pool
+    pool = _analysis_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, analyze_dataframe, df)
+    except BrokenProcessPool:
+        # One dead worker (OOM kill, segfault) breaks the whole executor.
+        # Replace it once, however many requests saw it break, and retry
+        # this analysis a single time on the fresh pool.
+        if _analysis_pool is pool:
+            logger.warning("Analysis worker pool broke; starting a new one")
+            _analysis_pool = _new_analysis_pool()
+            pool.shutdown(wait=False)
+        return await loop.run_in_executor(_analysis_pool, analyze_dataframe, df)
+
+async def process_upload(
+    file: UploadFile,
+    current_user: User,
+    background_tasks: BackgroundTasks,
+    include_analysis: bool = False
+) -> dict:
+    """Validate, parse, analyze and store a single uploaded file"""
     # Validate file type
     if not file.filename.endswith(('.csv', '.json')):
         raise HTTPException(status_code=400, detail="Only CSV and JSON files are supported")
     
-    # Check file size (50MB limit)
+    # Check file size (50MB limit). Starlette has already spooled the upload
+    # to a temporary file, so size it and parse from it without copying the
+    # payload into memory.
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
+    file_size = file.size
+    if file_size is None:
+        file_size = await asyncio.to_thread(file.file.seek, 0, os.SEEK_END)
+    if file_size > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
+    await file.seek(0)
     
     try:
         # Create dataset record
         dataset = Dataset(
             user_id=current_user.id,
             filename=file.filename,
-            file_size=len(content),
+            file_size=file_size,
             file_type=file.content_type or 'application/octet-stream'
         )
         
         start_time = datetime.now()
         
-        # Process the file based on type
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        elif file.filename.endswith('.json'):
-            df = pd.read_json(io.StringIO(content.decode('utf-8')))
+        # Process the file based on type. Gzip-encoded parts are inflated while
+        # parsing, and the size limit applies to the inflated bytes as well.
+        source = file.file
+        compressed = file.headers.get('content-encoding', '').lower() == 'gzip'
+        if compressed:
+            inflated = SizeLimitedReader(gzip.GzipFile(fileobj=file.file, mode='rb'), MAX_FILE_SIZE)
+            source = io.BufferedReader(inflated)
+        try:
+            df = await asyncio.to_thread(parse_upload, file.filename, source)
+        except (gzip.BadGzipFile, EOFError, zlib.error):
+            raise HTTPException(status_code=400, detail="File is not valid gzip data")
+        if compressed:
+            dataset.file_size = inflated.bytes_read
         
         # Update dataset with processing results
         dataset.status = "completed"
@@ -310,49 +632,93 @@ async def upload_dataset(
         dataset.row_count = len(df)
         dataset.column_count = len(df.columns)
         
-        # Store dataset
-        await db.datasets.insert_one(dataset.dict())
-        
         # Perform analysis
-        analysis_results = analyze_dataframe(df)
-        
-        # Generate AI insights
-        df_info = {
-            'row_count': dataset.row_count,
-            'column_count': dataset.column_count
-        }
-        ai_insights = await generate_ai_insights(analysis_results, df_info)
+        analysis_results = await run_analysis(df)
         
-        # Store analysis results
+        # Store analysis results; AI insights are filled in after the response
         analysis = DatasetAnalysis(
             dataset_id=dataset.id,
             summary_stats=analysis_results['summary_stats'],
             correlations=analysis_results['correlations'],
             missing_data=analysis_results['missing_data'],
             outliers=analysis_results['outliers'],
-            ai_insights=ai_insights
+            insights_status="pending"
         )
         
-        await db.analyses.insert_one(analysis.dict())
+        # Store dataset and analysis concurrently; a failure in either is
+        # handled below by marking the dataset as failed
+        await asyncio.gather(
+            db.datasets.insert_one(dataset.dict()),
+            db.analyses.insert_one(build_analysis_document(analysis))
+        )
         
-        return {
+        # Generate AI insights in the background; clients poll for them
+        df_info = {
+            'row_count': dataset.row_count,
+            'column_count': dataset.column_count
+        }
+        background_tasks.add_task(finish_ai_insights, analysis, analysis_results, df_info)
+        
+        result = {
             "message": "File processed successfully",
             "dataset_id": dataset.id,
             "processing_time": dataset.processing_time,
             "rows": dataset.row_count,
             "columns": dataset.column_count
         }
+        if include_analysis:
+            result["dataset"] = dataset.model_dump()
+            result["analysis"] = analysis.model_dump()
+        return result
         
+    except HTTPException:
+        # Rejected uploads leave no record, like the checks above
+        raise
     except Exception as e:
         # Update dataset status to failed
         dataset.status = "failed"
-        await db.datasets.insert_one(dataset.dict())
+        # The record may already exist if the failure happened after it was stored
+        await db.datasets.replace_one({"id": dataset.id}, dataset.dict(), upsert=True)
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
 
+# include_analysis=true also returns the stored analysis in the upload response,
+# with insights still pending
+@api_router.post("/datasets/upload")
+async def upload_dataset(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    include_analysis: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    return await process_upload(file, current_user, background_tasks, include_analysis)
+
+@api_router.post("/datasets/upload_batch")
+async def upload_datasets_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(..., alias="file"),
+    current_user: User = Depends(get_current_user)
+):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch upload")
+    
+    # One request carries several files; each gets its own result, in upload
+    # order, so one bad file does not fail the rest
+    async def process_one(file: UploadFile) -> dict:
+        try:
+            result = await process_upload(file, current_user, background_tasks)
+            return {"filename": file.filename, "status_code": 200, **result}
+        except HTTPException as e:
+            return {"filename": file.filename, "status_code": e.status_code, "detail": e.detail}
+    
+    return await asyncio.gather(*(process_one(file) for file in files))
+
 @api_router.get("/datasets")
 async def get_user_datasets(current_user: User = Depends(get_current_user)):
-    datasets = await db.datasets.find({"user_id": current_user.id}).to_list(100)
-    return [Dataset(**dataset) for dataset in datasets]
+    # Documents were validated on insert; project out _id and skip re-validation
+    projection = {"_id": 0, **{field: 1 for field in Dataset.model_fields}}
+    cursor = db.datasets.find({"user_id": current_user.id}, projection).sort("upload_time", -1).limit(100)
+    datasets = await cursor.to_list(100)
+    return [Dataset.model_construct(**dataset) for dataset in datasets]
 
 @api_router.get("/datasets/{dataset_id}/analysis")
 async def get_dataset_analysis(
@@ -365,14 +731,23 @@ async def get_dataset_analysis(
         raise HTTPException(status_code=404, detail="Dataset not found")
     
     # Get analysis results
-    analysis = await db.analyses.find_one({"dataset_id": dataset_id})
+    analysis = await db.analyses.find_one({"dataset_id": dataset_id}, {"_id": 0})
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    return {
-        "dataset": Dataset(**dataset),
-        "analysis": DatasetAnalysis(**analysis)
-    }
+    if 'payload_gz' in analysis:
+        analysis_json = gzip.decompress(analysis['payload_gz'])
+        if analysis.get('insights_status') == 'pending':
+            analysis_json = await expire_stale_insights(analysis_json)
+    else:
+        # Analyses stored before payloads were pre-serialized
+        analysis_json = orjson.dumps(DatasetAnalysis(**analysis).model_dump(), option=ORJSON_OPTIONS)
+    dataset_json = orjson.dumps(Dataset(**dataset).model_dump(), option=ORJSON_OPTIONS)
+    
+    return Response(
+        content=b'{"dataset":' + dataset_json + b',"analysis":' + analysis_json + b'}',
+        media_type="application/json"
+    )
 
 @api_router.delete("/datasets/{dataset_id}")
 async def delete_dataset(
@@ -385,8 +760,10 @@ async def delete_dataset(
         raise HTTPException(status_code=404, detail="Dataset not found")
     
     # Delete dataset and analysis
-    await db.datasets.delete_one({"id": dataset_id})
-    await db.analyses.delete_one({"dataset_id": dataset_id})
+    await asyncio.gather(
+        db.datasets.delete_one({"id": dataset_id}),
+        db.analyses.delete_one({"dataset_id": dataset_id})
+    )
     
     return {"message": "Dataset deleted successfully"}
 
@@ -417,6 +794,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Every hot query is an equality lookup on one of these fields. Indexes only
+    # speed things up, so a failure is logged and startup carries on.
+    indexes = [
+        (db.users, "email", {"unique": True}),
+        (db.users, "id", {"unique": True}),
+        (db.datasets, "id", {"unique": True}),
+        (db.datasets, [("user_id", 1), ("upload_time", -1)], {}),
+        (db.analyses, "dataset_id", {"unique": True}),
+    ]
+    for collection, keys, options in indexes:
+        try:
+            await collection.create_index(keys, **options)
+        except ServerSelectionTimeoutError:
+            logger.error("MongoDB unreachable; skipping index creation")
+            return
+        except OperationFailure:
+            # Typically duplicate values left by data written before the
+            # unique index existed; they must be removed before it can be built
+            logger.exception("Could not create index %s on %s", keys, collection.name)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+    _analysis_pool.shutdown()
\ No newline at end of file
@@ -4,13 +4,18 @@ DataPulse Backend API Testing Suite
 Tests all backend functionality including auth, file upload, data processing, and AI insights
 """
 
-import requests
-import json
+import httpx
+import orjson
 import io
-import pandas as pd
+import gzip
+import zlib
+import csv
+import base64
+from pathlib import Path
 import os
 from dotenv import load_dotenv
 import time
+import functools
 import sys
 
 # Load environment variables
@@ -18,12 +23,161 @@ load_dotenv('/app/frontend/.env')
 BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')
 API_BASE_URL = f"{BACKEND_URL}/api"
 
+# Auth token persisted between runs so valid tokens skip registration/login
+TOKEN_CACHE_PATH = Path(os.environ.get('DATAPULSE_TEST_TOKEN_PATH', '~/.datapulse_test_token.json')).expanduser()
+
 print(f"Testing backend at: {API_BASE_URL}")
 
+# Sample CSV columns
+_CSV_HEADER = ('customer_id', 'age', 'income', 'spending_score', 'region', 'purchase_amount')
+_IDS = tuple(range(1, 101))
+_AGES = (25, 34, 45, 23, 56, 67, 29, 38, 42, 31) * 10
+_INCOMES = (45000, 67000, 89000, 34000, 120000, 78000, 52000, 95000, 73000, 61000) * 10
+_SPEND = (78, 82, 45, 67, 23, 89, 91, 56, 73, 84) * 10
+_REGIONS = ('North', 'South', 'East', 'West', 'Central') * 20
+_AMOUNTS = (234.50, 567.80, 123.45, 890.12, 456.78, 234.56, 678.90, 345.67, 789.01, 123.45) * 10
+
+def _build_sample_csv():
+    """Create sample CSV data for testing"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(_CSV_HEADER)
+    writer.writerows(zip(_IDS, _AGES, _INCOMES, _SPEND, _REGIONS, _AMOUNTS))
+    return buffer.getvalue()
+
+def _build_sample_json():
+    """Create sample JSON data for testing"""
+    data = [
+        {
+            "product_id": i,
+            "product_name": f"Product_{i}",
+            "category": ["Electronics", "Clothing", "Books", "Home", "Sports"][i % 5],
+            "price": round(20.0 + (i * 15.5), 2),
+            "rating": round(3.0 + (i % 3), 1),
+            "sales_count": 100 + (i * 25),
+            "in_stock": i % 3 != 0
+        }
+        for i in range(1, 51)
+    ]
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+def rjson(response):
+    """Decode a response body with orjson"""
+    return orjson.loads(response.content)
+
+def _token_expiry(token):
+    """Read the exp claim from a JWT without verifying its signature"""
+    payload = token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return orjson.loads(base64.urlsafe_b64decode(payload))['exp']
+
+def _load_cached_token():
+    """Return the cached token for this backend if it is valid for at least another minute"""
+    try:
+        cached = orjson.loads(TOKEN_CACHE_PATH.read_bytes())
+    except (OSError, ValueError):
+        return None
+    if cached.get('backend_url') != BACKEND_URL or cached.get('exp', 0) <= time.time() + 60:
+        return None
+    return cached.get('token')
+
+def _save_cached_token(token):
+    try:
+        payload = orjson.dumps({
+            'token': token,
+            'exp': _token_expiry(token),
+            'backend_url': BACKEND_URL
+        })
+        # The token is a live credential, so only the owner may read the file,
+        # including one left behind with wider permissions by an older run
+        fd = os.open(TOKEN_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(fd, 0o600)
+            f.write(payload)
+    except (OSError, ValueError, IndexError, KeyError):
+        pass
+
+# Tests that only make sense once their prerequisites have passed. A test whose
+# prerequisite failed is reported as SKIPPED without touching the network.
+TEST_DEPENDENCIES = {
+    'batch_upload': ['auth'],
+    'data_analysis_retrieval': ['csv_upload'],
+    'dataset_listing': ['auth'],
+    'dataset_deletion': ['csv_upload'],
+}
+
+# Fixtures are fixed data, so build them once per process
+_CSV_FIXTURE = _build_sample_csv()
+_JSON_FIXTURE = _build_sample_json()
+
+# Gateway errors are transient; retry them rather than reporting a failed test
+RETRY_STATUSES = frozenset({502, 503, 504})
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.2
+
+class RetryTransport(httpx.HTTPTransport):
+    """HTTP transport that also retries transient gateway responses with backoff"""
+
+    def handle_request(self, request):
+        for attempt in range(RETRY_TOTAL):
+            response = super().handle_request(request)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            response.close()
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        return super().handle_request(request)
+
+class BearerAuth(httpx.Auth):
+    """Attach a bearer token whose header value is built once up front"""
+
+    def __init__(self, token):
+        self.header = f'Bearer {token}'
+
+    def auth_flow(self, request):
+        request.headers['Authorization'] = self.header
+        yield request
+
+class TestFailure(Exception):
+    """Raised inside a test to fail it with a message"""
+
+def _test(category, name):
+    """Record the decorated test under category: passed if it returns, failed if it raises"""
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper(self, *args, **kwargs):
+            try:
+                test(self, *args, **kwargs)
+            except Exception as e:
+                self.log_result(category, name, False, str(e))
+                return False
+            self.log_result(category, name, True)
+            return True
+        return wrapper
+    return decorator
+
+def _expect_status(response, status_code=200):
+    """Fail the current test unless the response has the expected status"""
+    if response.status_code != status_code:
+        raise TestFailure(f"Status {response.status_code}: {response.text}")
+
+def _expect_upload_status(result, status_code):
+    """Fail the current test unless one file's batch upload result has the expected status"""
+    if result.get('status_code') != status_code:
+        raise TestFailure(f"Status {result.get('status_code')}: {result.get('detail', result)}")
+
 class DataPulseAPITester:
     def __init__(self):
-        self.session = requests.Session()
-        self.auth_token = None
+        # Every call goes to the same host, so keep a warm pool of persistent connections
+        self.client = httpx.Client(
+            base_url=API_BASE_URL,
+            transport=RetryTransport(retries=2),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            timeout=120
+        )
+        self.auth_token = _load_cached_token()
+        self.using_cached_token = self.auth_token is not None
+        if self.using_cached_token:
+            self.client.auth = BearerAuth(self.auth_token)
         self.user_data = None
         self.test_results = {
             'auth': {'passed': 0, 'failed': 0, 'errors': []},
@@ -32,37 +186,76 @@ class DataPulseAPITester:
             'ai_insights': {'passed': 0, 'failed': 0, 'errors': []},
             'crud_operations': {'passed': 0, 'failed': 0, 'errors': []}
         }
+        for results in self.test_results.values():
+            results['skipped'] = 0
         self.dataset_id = None
+        self._analysis_cache = {}
+        self._passed = {}
+        # Output is buffered and written once per test section; per-line
+        # stdout writes are unbuffered in CI and dominate the fast tests
+        self._log = []
+
+    def echo(self, message):
+        """Buffer a line of output"""
+        self._log.append(message)
+
+    def flush_output(self):
+        """Write all buffered output to stdout"""
+        if not self._log:
+            return
+        sys.stdout.write('\n'.join(self._log) + '\n')
+        sys.stdout.flush()
+        self._log.clear()
 
     def log_result(self, category, test_name, success, error_msg=None):
         """Log test results"""
         if success:
             self.test_results[category]['passed'] += 1
-            print(f"✅ {test_name}")
+            self.echo(f"✅ {test_name}")
         else:
             self.test_results[category]['failed'] += 1
             self.test_results[category]['errors'].append(f"{test_name}: {error_msg}")
-            print(f"❌ {test_name}: {error_msg}")
+            self.echo(f"❌ {test_name}: {error_msg}")
+
+    def run_test(self, key, category, test_name, test, skip_counts=None):
+        """Run a test unless one of its prerequisites failed; record the outcome under key.
+
+        skip_counts maps each category test records results under to how many
+        it records there, so a skipped group of tests is counted once per test
+        in the right category. Defaults to one result under category.
+        """
+        failed_deps = [dep for dep in TEST_DEPENDENCIES.get(key, []) if not self._passed.get(dep)]
+        if failed_deps:
+            for skipped_category, count in (skip_counts or {category: 1}).items():
+                self.test_results[skipped_category]['skipped'] += count
+            self.echo(f"⏭️  {test_name}: SKIPPED (prerequisite failed: {', '.join(failed_deps)})")
+            self._passed[key] = False
+            return False
+        t0 = time.perf_counter_ns()
+        self._passed[key] = bool(test())
+        self.echo(f"   Took {(time.perf_counter_ns() - t0) / 1e6:.1f} ms")
+        return self._passed[key]
 
     def test_health_check(self):
         """Test basic API health"""
-        print("\n=== Testing API Health ===")
+        self.echo("\n=== Testing API Health ===")
         try:
-            response = self.session.get(f"{API_BASE_URL}/health")
+            response = self.client.get("/health")
             if response.status_code == 200:
-                data = response.json()
-                print(f"✅ API Health Check: {data}")
+                data = rjson(response)
+                self.echo(f"✅ API Health Check: {data}")
                 return True
             else:
-                print(f"❌ API Health Check failed: {response.status_code}")
+                self.echo(f"❌ API Health Check failed: {response.status_code}")
                 return False
         except Exception as e:
-            print(f"❌ API Health Check failed: {str(e)}")
+            self.echo(f"❌ API Health Check failed: {str(e)}")
             return False
 
+    @_test('auth', 'User Registration')
     def test_user_registration(self):
         """Test user registration"""
-        print("\n=== Testing User Registration ===")
+        self.echo("\n=== Testing User Registration ===")
         
         # Test data
         user_data = {
@@ -71,443 +264,348 @@ class DataPulseAPITester:
             "password": "SecurePass123!"
         }
         
-        try:
-            response = self.session.post(f"{API_BASE_URL}/auth/register", json=user_data)
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.auth_token = data.get('access_token')
-                self.user_data = data.get('user')
-                
-                # Set authorization header for future requests
-                self.session.headers.update({'Authorization': f'Bearer {self.auth_token}'})
-                
-                self.log_result('auth', 'User Registration', True)
-                print(f"   User ID: {self.user_data['id']}")
-                print(f"   Token received: {self.auth_token[:20]}...")
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('auth', 'User Registration', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('auth', 'User Registration', False, str(e))
-            return False
+        response = self.client.post(
+            "/auth/register",
+            content=orjson.dumps(user_data),
+            headers={'Content-Type': 'application/json'}
+        )
+        _expect_status(response)
+        
+        data = rjson(response)
+        self.auth_token = data.get('access_token')
+        self.user_data = data.get('user')
+        
+        # Authenticate future requests with this token
+        self.client.auth = BearerAuth(self.auth_token)
+        _save_cached_token(self.auth_token)
+        
+        self.echo(f"   User ID: {self.user_data['id']}")
+        self.echo(f"   Token received: {self.auth_token[:20]}...")
 
+    @_test('auth', 'User Login')
     def test_user_login(self):
         """Test user login with existing credentials"""
-        print("\n=== Testing User Login ===")
+        self.echo("\n=== Testing User Login ===")
         
         login_data = {
             "email": "sarah.analyst@datapulse.com",
             "password": "SecurePass123!"
         }
         
-        try:
-            # Clear existing auth for login test
-            temp_headers = self.session.headers.copy()
-            if 'Authorization' in self.session.headers:
-                del self.session.headers['Authorization']
-            
-            response = self.session.post(f"{API_BASE_URL}/auth/login", json=login_data)
-            
-            if response.status_code == 200:
-                data = response.json()
-                token = data.get('access_token')
-                user = data.get('user')
-                
-                # Restore auth header
-                self.session.headers.update({'Authorization': f'Bearer {token}'})
-                
-                self.log_result('auth', 'User Login', True)
-                print(f"   Login successful for: {user['email']}")
-                return True
-            else:
-                # Restore original headers
-                self.session.headers = temp_headers
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('auth', 'User Login', False, error_msg)
-                return False
-                
-        except Exception as e:
-            # Restore original headers
-            self.session.headers = temp_headers
-            self.log_result('auth', 'User Login', False, str(e))
-            return False
+        # Send this one request without auth; the client itself is left untouched
+        response = self.client.post(
+            "/auth/login",
+            content=orjson.dumps(login_data),
+            headers={'Content-Type': 'application/json'},
+            auth=None
+        )
+        _expect_status(response)
+        
+        data = rjson(response)
+        token = data.get('access_token')
+        user = data.get('user')
+        
+        # Use the login token for future requests
+        self.auth_token = token
+        self.client.auth = BearerAuth(token)
+        _save_cached_token(token)
+        
+        self.echo(f"   Login successful for: {user['email']}")
 
+    @_test('auth', 'Protected Route Access')
     def test_protected_route(self):
         """Test JWT token validation on protected route"""
-        print("\n=== Testing Protected Route Access ===")
+        self.echo("\n=== Testing Protected Route Access ===")
         
-        try:
-            response = self.session.get(f"{API_BASE_URL}/auth/me")
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.log_result('auth', 'Protected Route Access', True)
-                print(f"   Current user: {data['username']} ({data['email']})")
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('auth', 'Protected Route Access', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('auth', 'Protected Route Access', False, str(e))
-            return False
+        response = self.client.get("/auth/me")
+        _expect_status(response)
+        
+        data = rjson(response)
+        self.echo(f"   Current user: {data['username']} ({data['email']})")
 
-    def create_sample_csv(self):
-        """Create sample CSV data for testing"""
-        data = {
-            'customer_id': range(1, 101),
-            'age': [25, 34, 45, 23, 56, 67, 29, 38, 42, 31] * 10,
-            'income': [45000, 67000, 89000, 34000, 120000, 78000, 52000, 95000, 73000, 61000] * 10,
-            'spending_score': [78, 82, 45, 67, 23, 89, 91, 56, 73, 84] * 10,
-            'region': ['North', 'South', 'East', 'West', 'Central'] * 20,
-            'purchase_amount': [234.50, 567.80, 123.45, 890.12, 456.78, 234.56, 678.90, 345.67, 789.01, 123.45] * 10
-        }
-        df = pd.DataFrame(data)
-        return df.to_csv(index=False)
-
-    def create_sample_json(self):
-        """Create sample JSON data for testing"""
-        data = [
-            {
-                "product_id": i,
-                "product_name": f"Product_{i}",
-                "category": ["Electronics", "Clothing", "Books", "Home", "Sports"][i % 5],
-                "price": round(20.0 + (i * 15.5), 2),
-                "rating": round(3.0 + (i % 3), 1),
-                "sales_count": 100 + (i * 25),
-                "in_stock": i % 3 != 0
-            }
-            for i in range(1, 51)
+    @_test('file_upload', 'Batch File Upload')
+    def test_batch_upload(self):
+        """Test every upload case in a single multipart request"""
+        self.echo("\n=== Testing Batch File Upload ===")
+        
+        # Create a large CSV content (simulate large file). Sent once as-is and
+        # once gzip-encoded (~1.6MB -> ~4KB); both are under 50MB
+        large_content = b"col1,col2,col3\n" + b"test,data,values\n" * 100000
+        
+        # ~60MB of CSV that gzips to well under 1MB, compressed in chunks so
+        # the inflated payload is never held in memory here
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        chunk = b"1,2,3\n" * 175000
+        inflated = compressor.compress(b"a,b,c\n") + b"".join(compressor.compress(chunk) for _ in range(60))
+        inflated += compressor.flush()
+        
+        gzipped = {'Content-Encoding': 'gzip'}
+        files = [
+            ('file', ('customer_data.csv', _CSV_FIXTURE, 'text/csv')),
+            ('file', ('product_data.json', _JSON_FIXTURE, 'application/json')),
+            ('file', ('test.txt', 'This is a text file', 'text/plain')),
+            ('file', ('large_test.csv', large_content, 'text/csv')),
+            ('file', ('large_test.csv', gzip.compress(large_content), 'text/csv', gzipped)),
+            ('file', ('inflated_test.csv', inflated, 'text/csv', gzipped))
         ]
-        return json.dumps(data, indent=2)
+        
+        response = self.client.post("/datasets/upload_batch", files=files)
+        _expect_status(response)
+        
+        results = rjson(response)
+        if len(results) != len(files):
+            raise TestFailure(f"Expected {len(files)} results, got {len(results)}")
+        
+        for result in results:
+            self.echo(f"   {result.get('filename')}: {result.get('status_code')}")
+        
+        # Each file is checked on its own result; later tests need the CSV dataset
+        csv_result, json_result, text_result, large_result, large_gz_result, inflated_result = results
+        self._passed['csv_upload'] = self.test_csv_file_upload(csv_result)
+        self.test_json_file_upload(json_result)
+        self.test_invalid_file_type(text_result)
+        self.test_file_size_validation(large_result, large_gz_result)
+        self.test_inflated_size_limit(inflated_result)
 
-    def test_csv_file_upload(self):
+    @_test('file_upload', 'CSV File Upload')
+    def test_csv_file_upload(self, result):
         """Test CSV file upload and validation"""
-        print("\n=== Testing CSV File Upload ===")
+        _expect_upload_status(result, 200)
+        self.dataset_id = result.get('dataset_id')
         
-        try:
-            csv_content = self.create_sample_csv()
-            
-            files = {
-                'file': ('customer_data.csv', csv_content, 'text/csv')
-            }
-            
-            response = self.session.post(f"{API_BASE_URL}/datasets/upload", files=files)
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.dataset_id = data.get('dataset_id')
-                
-                self.log_result('file_upload', 'CSV File Upload', True)
-                print(f"   Dataset ID: {self.dataset_id}")
-                print(f"   Processing time: {data.get('processing_time', 0):.2f}s")
-                print(f"   Rows: {data.get('rows')}, Columns: {data.get('columns')}")
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('file_upload', 'CSV File Upload', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('file_upload', 'CSV File Upload', False, str(e))
-            return False
+        self.echo(f"     Dataset ID: {self.dataset_id}")
+        self.echo(f"     Processing time: {result.get('processing_time', 0):.2f}s")
+        self.echo(f"     Rows: {result.get('rows')}, Columns: {result.get('columns')}")
 
-    def test_json_file_upload(self):
+    @_test('file_upload', 'JSON File Upload')
+    def test_json_file_upload(self, result):
         """Test JSON file upload and validation"""
-        print("\n=== Testing JSON File Upload ===")
+        _expect_upload_status(result, 200)
         
-        try:
-            json_content = self.create_sample_json()
-            
-            files = {
-                'file': ('product_data.json', json_content, 'application/json')
-            }
-            
-            response = self.session.post(f"{API_BASE_URL}/datasets/upload", files=files)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                self.log_result('file_upload', 'JSON File Upload', True)
-                print(f"   Dataset ID: {data.get('dataset_id')}")
-                print(f"   Processing time: {data.get('processing_time', 0):.2f}s")
-                print(f"   Rows: {data.get('rows')}, Columns: {data.get('columns')}")
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('file_upload', 'JSON File Upload', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('file_upload', 'JSON File Upload', False, str(e))
-            return False
+        self.echo(f"     Dataset ID: {result.get('dataset_id')}")
+        self.echo(f"     Rows: {result.get('rows')}, Columns: {result.get('columns')}")
 
-    def test_file_size_validation(self):
-        """Test file size limit validation (50MB)"""
-        print("\n=== Testing File Size Validation ===")
+    @_test('file_upload', 'Invalid File Type Rejection')
+    def test_invalid_file_type(self, result):
+        """Test invalid file type rejection"""
+        _expect_upload_status(result, 400)
         
-        try:
-            # Create a large CSV content (simulate large file)
-            large_content = "col1,col2,col3\n" + "test,data,values\n" * 100000  # Should be under 50MB
-            
-            files = {
-                'file': ('large_test.csv', large_content, 'text/csv')
-            }
-            
-            response = self.session.post(f"{API_BASE_URL}/datasets/upload", files=files)
-            
-            # This should succeed as it's under 50MB
-            if response.status_code == 200:
-                self.log_result('file_upload', 'File Size Validation (Valid)', True)
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('file_upload', 'File Size Validation (Valid)', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('file_upload', 'File Size Validation (Valid)', False, str(e))
-            return False
+        self.echo(f"     Correctly rejected: {result.get('detail', 'Unknown error')}")
 
-    def test_invalid_file_type(self):
-        """Test invalid file type rejection"""
-        print("\n=== Testing Invalid File Type Rejection ===")
+    @_test('file_upload', 'File Size Validation (Valid)')
+    def test_file_size_validation(self, *results):
+        """Test file size limit validation (50MB)"""
+        for result in results:
+            _expect_upload_status(result, 200)
+
+    @_test('file_upload', 'File Size Validation (Inflated Over Limit)')
+    def test_inflated_size_limit(self, result):
+        """Test that the 50MB limit applies to gzip-encoded uploads once inflated"""
+        _expect_upload_status(result, 400)
+
+    def fetch_analysis(self, dataset_id):
+        """Fetch the analysis bundle for a dataset once and reuse it afterwards.
+
+        The endpoint already returns every analysis component, so the
+        component checks validate this one payload in-process. Returns
+        (data, error_msg); data is None when the request failed.
+        """
+        cached = self._analysis_cache.get(dataset_id)
+        if cached is not None and cached['analysis'].get('insights_status') != 'pending':
+            return cached, None
         
-        try:
-            # Try to upload a text file (should be rejected)
-            files = {
-                'file': ('test.txt', 'This is a text file', 'text/plain')
-            }
-            
-            response = self.session.post(f"{API_BASE_URL}/datasets/upload", files=files)
-            
-            # This should fail with 400 status
-            if response.status_code == 400:
-                self.log_result('file_upload', 'Invalid File Type Rejection', True)
-                print(f"   Correctly rejected: {response.json().get('detail', 'Unknown error')}")
-                return True
-            else:
-                error_msg = f"Expected 400, got {response.status_code}: {response.text}"
-                self.log_result('file_upload', 'Invalid File Type Rejection', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('file_upload', 'Invalid File Type Rejection', False, str(e))
-            return False
+        # AI insights are generated in the background after upload
+        deadline = time.perf_counter_ns() + 60 * 10**9
+        while True:
+            response = self.client.get(f"/datasets/{dataset_id}/analysis")
+            if response.status_code != 200:
+                return None, f"Status {response.status_code}: {response.text}"
+            data = rjson(response)
+            if data.get('analysis', {}).get('insights_status') != 'pending' or time.perf_counter_ns() > deadline:
+                break
+            time.sleep(1)
+        
+        self._analysis_cache[dataset_id] = data
+        return data, None
 
+    @_test('data_processing', 'Data Analysis Retrieval')
     def test_data_analysis_retrieval(self):
         """Test data analysis retrieval"""
-        print("\n=== Testing Data Analysis Retrieval ===")
+        self.echo("\n=== Testing Data Analysis Retrieval ===")
         
         if not self.dataset_id:
-            self.log_result('data_processing', 'Data Analysis Retrieval', False, "No dataset ID available")
-            return False
+            raise TestFailure("No dataset ID available")
         
-        try:
-            response = self.session.get(f"{API_BASE_URL}/datasets/{self.dataset_id}/analysis")
-            
-            if response.status_code == 200:
-                data = response.json()
-                dataset = data.get('dataset', {})
-                analysis = data.get('analysis', {})
-                
-                # Verify analysis components
-                has_summary_stats = bool(analysis.get('summary_stats'))
-                has_correlations = 'correlations' in analysis
-                has_missing_data = bool(analysis.get('missing_data'))
-                has_outliers = 'outliers' in analysis
-                has_ai_insights = bool(analysis.get('ai_insights'))
-                
-                self.log_result('data_processing', 'Data Analysis Retrieval', True)
-                print(f"   Dataset: {dataset.get('filename')} ({dataset.get('status')})")
-                print(f"   Summary Stats: {'✅' if has_summary_stats else '❌'}")
-                print(f"   Correlations: {'✅' if has_correlations else '❌'}")
-                print(f"   Missing Data Analysis: {'✅' if has_missing_data else '❌'}")
-                print(f"   Outlier Detection: {'✅' if has_outliers else '❌'}")
-                print(f"   AI Insights: {'✅' if has_ai_insights else '❌'}")
-                
-                # Test individual components
-                self.test_summary_statistics(analysis.get('summary_stats', {}))
-                self.test_correlation_analysis(analysis.get('correlations', {}))
-                self.test_missing_data_analysis(analysis.get('missing_data', {}))
-                self.test_outlier_detection(analysis.get('outliers', {}))
-                self.test_ai_insights_content(analysis.get('ai_insights', ''))
-                
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('data_processing', 'Data Analysis Retrieval', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('data_processing', 'Data Analysis Retrieval', False, str(e))
-            return False
+        data, error_msg = self.fetch_analysis(self.dataset_id)
+        if data is None:
+            raise TestFailure(error_msg)
+        
+        dataset = data.get('dataset', {})
+        analysis = data.get('analysis', {})
+        
+        # Verify analysis components
+        has_summary_stats = bool(analysis.get('summary_stats'))
+        has_correlations = 'correlations' in analysis
+        has_missing_data = bool(analysis.get('missing_data'))
+        has_outliers = 'outliers' in analysis
+        has_ai_insights = bool(analysis.get('ai_insights'))
+        
+        self.echo(f"   Dataset: {dataset.get('filename')} ({dataset.get('status')})")
+        self.echo(f"   Summary Stats: {'✅' if has_summary_stats else '❌'}")
+        self.echo(f"   Correlations: {'✅' if has_correlations else '❌'}")
+        self.echo(f"   Missing Data Analysis: {'✅' if has_missing_data else '❌'}")
+        self.echo(f"   Outlier Detection: {'✅' if has_outliers else '❌'}")
+        self.echo(f"   AI Insights: {'✅' if has_ai_insights else '❌'}")
+        
+        # Test individual components
+        self.test_summary_statistics(analysis.get('summary_stats', {}))
+        self.test_correlation_analysis(analysis.get('correlations', {}))
+        self.test_missing_data_analysis(analysis.get('missing_data', {}))
+        self.test_outlier_detection(analysis.get('outliers', {}))
+        self.test_ai_insights_content(analysis.get('ai_insights', ''))
 
+    @_test('data_processing', 'Summary Statistics Generation')
     def test_summary_statistics(self, summary_stats):
         """Test summary statistics component"""
-        try:
-            has_numeric = bool(summary_stats.get('numeric'))
-            has_categorical = bool(summary_stats.get('categorical'))
-            
-            if has_numeric or has_categorical:
-                self.log_result('data_processing', 'Summary Statistics Generation', True)
-                print(f"     Numeric stats: {'✅' if has_numeric else '❌'}")
-                print(f"     Categorical stats: {'✅' if has_categorical else '❌'}")
-            else:
-                self.log_result('data_processing', 'Summary Statistics Generation', False, "No statistics generated")
-        except Exception as e:
-            self.log_result('data_processing', 'Summary Statistics Generation', False, str(e))
+        has_numeric = bool(summary_stats.get('numeric'))
+        has_categorical = bool(summary_stats.get('categorical'))
+        
+        if not (has_numeric or has_categorical):
+            raise TestFailure("No statistics generated")
+        
+        self.echo(f"     Numeric stats: {'✅' if has_numeric else '❌'}")
+        self.echo(f"     Categorical stats: {'✅' if has_categorical else '❌'}")
 
+    @_test('data_processing', 'Correlation Analysis')
     def test_correlation_analysis(self, correlations):
         """Test correlation analysis component"""
-        try:
-            if correlations and len(correlations) > 0:
-                self.log_result('data_processing', 'Correlation Analysis', True)
-                print(f"     Correlation matrix generated with {len(correlations)} variables")
-            else:
-                self.log_result('data_processing', 'Correlation Analysis', True)
-                print(f"     No correlations (expected for single numeric column)")
-        except Exception as e:
-            self.log_result('data_processing', 'Correlation Analysis', False, str(e))
+        if correlations and len(correlations) > 0:
+            self.echo(f"     Correlation matrix generated with {len(correlations)} variables")
+        else:
+            self.echo(f"     No correlations (expected for single numeric column)")
 
+    @_test('data_processing', 'Missing Data Analysis')
     def test_missing_data_analysis(self, missing_data):
         """Test missing data analysis component"""
-        try:
-            has_total = bool(missing_data.get('total_missing'))
-            has_percentage = bool(missing_data.get('percentage_missing'))
-            
-            if has_total and has_percentage:
-                self.log_result('data_processing', 'Missing Data Analysis', True)
-                print(f"     Missing data analysis completed")
-            else:
-                self.log_result('data_processing', 'Missing Data Analysis', False, "Missing data analysis incomplete")
-        except Exception as e:
-            self.log_result('data_processing', 'Missing Data Analysis', False, str(e))
+        has_total = bool(missing_data.get('total_missing'))
+        has_percentage = bool(missing_data.get('percentage_missing'))
+        
+        if not (has_total and has_percentage):
+            raise TestFailure("Missing data analysis incomplete")
+        
+        self.echo(f"     Missing data analysis completed")
 
+    @_test('data_processing', 'Outlier Detection')
     def test_outlier_detection(self, outliers):
         """Test outlier detection component"""
-        try:
-            if 'error' in outliers:
-                self.log_result('data_processing', 'Outlier Detection', True)
-                print(f"     Outlier detection handled gracefully: {outliers['error']}")
-            elif 'total_outliers' in outliers:
-                self.log_result('data_processing', 'Outlier Detection', True)
-                print(f"     Outliers detected: {outliers.get('total_outliers', 0)}")
-            else:
-                self.log_result('data_processing', 'Outlier Detection', False, "No outlier analysis results")
-        except Exception as e:
-            self.log_result('data_processing', 'Outlier Detection', False, str(e))
+        if 'error' in outliers:
+            self.echo(f"     Outlier detection handled gracefully: {outliers['error']}")
+        elif 'total_outliers' in outliers:
+            self.echo(f"     Outliers detected: {outliers.get('total_outliers', 0)}")
+        else:
+            raise TestFailure("No outlier analysis results")
 
+    @_test('ai_insights', 'AI Insights Generation')
     def test_ai_insights_content(self, ai_insights):
         """Test AI insights generation"""
-        try:
-            if ai_insights and len(ai_insights.strip()) > 50:  # Reasonable content length
-                if "AI insights unavailable" in ai_insights or "failed" in ai_insights.lower():
-                    self.log_result('ai_insights', 'AI Insights Generation', False, ai_insights)
-                else:
-                    self.log_result('ai_insights', 'AI Insights Generation', True)
-                    print(f"     AI insights generated ({len(ai_insights)} characters)")
-                    print(f"     Preview: {ai_insights[:100]}...")
-            else:
-                self.log_result('ai_insights', 'AI Insights Generation', False, "No meaningful AI insights generated")
-        except Exception as e:
-            self.log_result('ai_insights', 'AI Insights Generation', False, str(e))
+        if not ai_insights or len(ai_insights.strip()) <= 50:  # Reasonable content length
+            raise TestFailure("No meaningful AI insights generated")
+        if "AI insights unavailable" in ai_insights or "failed" in ai_insights.lower():
+            raise TestFailure(ai_insights)
+        
+        self.echo(f"     AI insights generated ({len(ai_insights)} characters)")
+        self.echo(f"     Preview: {ai_insights[:100]}...")
 
+    @_test('crud_operations', 'Dataset Listing')
     def test_dataset_listing(self):
         """Test dataset listing with user isolation"""
-        print("\n=== Testing Dataset Listing ===")
+        self.echo("\n=== Testing Dataset Listing ===")
         
-        try:
-            response = self.session.get(f"{API_BASE_URL}/datasets")
-            
-            if response.status_code == 200:
-                datasets = response.json()
-                
-                self.log_result('crud_operations', 'Dataset Listing', True)
-                print(f"   Found {len(datasets)} datasets for current user")
-                
-                for i, dataset in enumerate(datasets[:3]):  # Show first 3
-                    print(f"     {i+1}. {dataset.get('filename')} ({dataset.get('status')})")
-                
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('crud_operations', 'Dataset Listing', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('crud_operations', 'Dataset Listing', False, str(e))
-            return False
+        response = self.client.get("/datasets")
+        _expect_status(response)
+        
+        datasets = rjson(response)
+        self.echo(f"   Found {len(datasets)} datasets for current user")
+        
+        for i, dataset in enumerate(datasets[:3]):  # Show first 3
+            self.echo(f"     {i+1}. {dataset.get('filename')} ({dataset.get('status')})")
 
+    @_test('crud_operations', 'Dataset Deletion')
     def test_dataset_deletion(self):
         """Test dataset deletion"""
-        print("\n=== Testing Dataset Deletion ===")
+        self.echo("\n=== Testing Dataset Deletion ===")
         
         if not self.dataset_id:
-            self.log_result('crud_operations', 'Dataset Deletion', False, "No dataset ID available")
-            return False
+            raise TestFailure("No dataset ID available")
         
-        try:
-            response = self.session.delete(f"{API_BASE_URL}/datasets/{self.dataset_id}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.log_result('crud_operations', 'Dataset Deletion', True)
-                print(f"   {data.get('message', 'Dataset deleted')}")
-                
-                # Verify deletion by trying to access the dataset
-                verify_response = self.session.get(f"{API_BASE_URL}/datasets/{self.dataset_id}/analysis")
-                if verify_response.status_code == 404:
-                    print(f"   ✅ Deletion verified - dataset no longer accessible")
-                else:
-                    print(f"   ⚠️  Dataset still accessible after deletion")
-                
-                return True
-            else:
-                error_msg = f"Status {response.status_code}: {response.text}"
-                self.log_result('crud_operations', 'Dataset Deletion', False, error_msg)
-                return False
-                
-        except Exception as e:
-            self.log_result('crud_operations', 'Dataset Deletion', False, str(e))
-            return False
+        response = self.client.delete(f"/datasets/{self.dataset_id}")
+        _expect_status(response)
+        
+        data = rjson(response)
+        self._analysis_cache.pop(self.dataset_id, None)
+        self.echo(f"   {data.get('message', 'Dataset deleted')}")
+        
+        # Verify deletion by trying to access the dataset
+        verify_response = self.client.get(f"/datasets/{self.dataset_id}/analysis")
+        if verify_response.status_code == 404:
+            self.echo(f"   ✅ Deletion verified - dataset no longer accessible")
+        else:
+            self.echo(f"   ⚠️  Dataset still accessible after deletion")
 
     def run_all_tests(self):
         """Run all backend tests"""
-        print("🚀 Starting DataPulse Backend API Tests")
-        print("=" * 50)
+        self.echo("🚀 Starting DataPulse Backend API Tests")
+        self.echo("=" * 50)
         
         # Health check first
         if not self.test_health_check():
-            print("❌ API is not accessible. Stopping tests.")
+            self.echo("❌ API is not accessible. Stopping tests.")
+            self.flush_output()
             return False
+        self.flush_output()
         
         # Authentication tests
-        print("\n🔐 AUTHENTICATION TESTS")
-        self.test_user_registration()
-        self.test_user_login()
-        self.test_protected_route()
+        self.echo("\n🔐 AUTHENTICATION TESTS")
+        if self.using_cached_token and self.client.get("/auth/me").status_code == 401:
+            # Stale token (e.g. the database was reset): forget it and authenticate afresh
+            self.echo("\n⚠️  Cached auth token was rejected; registering and logging in instead")
+            TOKEN_CACHE_PATH.unlink(missing_ok=True)
+            self.client.auth = None
+            self.auth_token = None
+            self.using_cached_token = False
+        if self.using_cached_token:
+            self.echo(f"\n⏭️  Reusing cached auth token from {TOKEN_CACHE_PATH}; registration and login SKIPPED")
+            self.test_results['auth']['skipped'] += 2
+            self._passed['auth'] = self.test_protected_route()
+        else:
+            self.test_user_registration()
+            self.test_user_login()
+            self._passed['auth'] = self.test_protected_route()
+        self.flush_output()
         
         # File upload tests
-        print("\n📁 FILE UPLOAD TESTS")
-        self.test_csv_file_upload()
-        self.test_json_file_upload()
-        self.test_file_size_validation()
-        self.test_invalid_file_type()
+        self.echo("\n📁 FILE UPLOAD TESTS")
+        self.run_test(
+            'batch_upload', 'file_upload', 'Batch File Upload', self.test_batch_upload,
+            skip_counts={'file_upload': 6}
+        )
+        self.flush_output()
         
         # Data processing tests (depends on successful upload)
-        print("\n📊 DATA PROCESSING TESTS")
-        self.test_data_analysis_retrieval()
+        self.echo("\n📊 DATA PROCESSING TESTS")
+        self.run_test(
+            'data_analysis_retrieval', 'data_processing', 'Data Analysis Retrieval',
+            self.test_data_analysis_retrieval,
+            # Retrieval plus its four component checks, and the AI insights check
+            skip_counts={'data_processing': 5, 'ai_insights': 1}
+        )
+        self.flush_output()
         
         # CRUD operations tests
-        print("\n🔄 CRUD OPERATIONS TESTS")
-        self.test_dataset_listing()
-        self.test_dataset_deletion()
+        self.echo("\n🔄 CRUD OPERATIONS TESTS")
+        self.run_test('dataset_listing', 'crud_operations', 'Dataset Listing', self.test_dataset_listing)
+        self.run_test('dataset_deletion', 'crud_operations', 'Dataset Deletion', self.test_dataset_deletion)
+        self.flush_output()
         
         # Print summary
         self.print_test_summary()
@@ -516,40 +614,50 @@ class DataPulseAPITester:
 
     def print_test_summary(self):
         """Print comprehensive test summary"""
-        print("\n" + "=" * 50)
-        print("📋 TEST SUMMARY")
-        print("=" * 50)
+        self.echo("\n" + "=" * 50)
+        self.echo("📋 TEST SUMMARY")
+        self.echo("=" * 50)
         
         total_passed = 0
         total_failed = 0
+        total_skipped = 0
         
         for category, results in self.test_results.items():
             passed = results['passed']
             failed = results['failed']
+            skipped = results['skipped']
             total_passed += passed
             total_failed += failed
+            total_skipped += skipped
             
             status = "✅" if failed == 0 else "❌"
-            print(f"{status} {category.upper().replace('_', ' ')}: {passed} passed, {failed} failed")
+            skipped_note = f", {skipped} skipped" if skipped else ""
+            self.echo(f"{status} {category.upper().replace('_', ' ')}: {passed} passed, {failed} failed{skipped_note}")
             
             # Show errors
             for error in results['errors']:
-                print(f"   ❌ {error}")
+                self.echo(f"   ❌ {error}")
         
-        print(f"\n🎯 OVERALL: {total_passed} passed, {total_failed} failed")
+        skipped_note = f", {total_skipped} skipped" if total_skipped else ""
+        self.echo(f"\n🎯 OVERALL: {total_passed} passed, {total_failed} failed{skipped_note}")
         
         if total_failed == 0:
-            print("🎉 All tests passed!")
+            self.echo("🎉 All tests passed!")
         else:
-            print(f"⚠️  {total_failed} tests failed - see details above")
+            self.echo(f"⚠️  {total_failed} tests failed - see details above")
         
+        self.flush_output()
         return total_failed == 0
 
 
 def main():
     """Main test execution"""
     tester = DataPulseAPITester()
-    success = tester.run_all_tests()
+    try:
+        success = tester.run_all_tests()
+    finally:
+        # Don't lose buffered output if the run is interrupted
+        tester.flush_output()
     
     # Exit with appropriate code
     sys.exit(0 if success else 1)
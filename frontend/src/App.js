@@ -1,10 +1,14 @@
-import React, { useState, useEffect, useContext, createContext } from 'react';
+import React, { useState, useEffect, useContext, createContext, useRef } from 'react';
 import axios from 'axios';
 import './App.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// AI insights are generated after upload; poll for them this often, this many times
+const INSIGHTS_POLL_INTERVAL_MS = 3000;
+const INSIGHTS_MAX_POLLS = 40;
+
 // Create Auth Context
 const AuthContext = createContext();
 
@@ -455,10 +459,10 @@ const DatasetList = ({ datasets, onSelectDataset, selectedDataset }) => {
 };
 
 // Analysis Display Component
-const AnalysisDisplay = ({ analysis }) => {
+const AnalysisDisplay = ({ analysis, insightsTimedOut }) => {
   if (!analysis) return null;
 
-  const { summary_stats, correlations, missing_data, outliers, ai_insights } = analysis;
+  const { summary_stats, correlations, missing_data, outliers, ai_insights, insights_status } = analysis;
 
   return (
     <div className="space-y-6">
@@ -471,6 +475,22 @@ const AnalysisDisplay = ({ analysis }) => {
           <p className="text-blue-800 whitespace-pre-wrap">{ai_insights}</p>
         </div>
       )}
+      {!ai_insights && insights_status === 'pending' && (
+        <div className="bg-blue-50 border border-blue-200 rounded-lg p-4">
+          <h4 className="font-medium text-blue-900 mb-2">🤖 AI Insights</h4>
+          <p className="text-blue-800">
+            {insightsTimedOut
+              ? 'Insights are taking longer than expected. Select this dataset again to check for them.'
+              : 'Insights are still being generated...'}
+          </p>
+        </div>
+      )}
+      {!ai_insights && insights_status === 'failed' && (
+        <div className="bg-blue-50 border border-blue-200 rounded-lg p-4">
+          <h4 className="font-medium text-blue-900 mb-2">🤖 AI Insights</h4>
+          <p className="text-blue-800">AI insights could not be generated for this dataset.</p>
+        </div>
+      )}
 
       {/* Summary Statistics */}
       <div className="bg-white border border-gray-200 rounded-lg p-4">
@@ -597,6 +617,8 @@ const Dashboard = () => {
   const [analysisData, setAnalysisData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [analysisLoading, setAnalysisLoading] = useState(false);
+  const [insightsPolls, setInsightsPolls] = useState(0);
+  const selectedIdRef = useRef(null);
   const { user, logout, token } = useAuth();
 
   const fetchDatasets = async () => {
@@ -611,17 +633,21 @@ const Dashboard = () => {
     setLoading(false);
   };
 
-  const fetchAnalysis = async (datasetId) => {
-    setAnalysisLoading(true);
+  const fetchAnalysis = async (datasetId, { poll = false } = {}) => {
+    // Polls refresh in place instead of showing the loading spinner
+    if (!poll) setAnalysisLoading(true);
     try {
       const response = await axios.get(`${API}/datasets/${datasetId}/analysis`, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setAnalysisData(response.data.analysis);
+      // Ignore responses for a dataset that is no longer selected
+      if (selectedIdRef.current === datasetId) {
+        setAnalysisData(response.data.analysis);
+      }
     } catch (error) {
       console.error('Failed to fetch analysis:', error);
     }
-    setAnalysisLoading(false);
+    if (!poll) setAnalysisLoading(false);
   };
 
   useEffect(() => {
@@ -629,6 +655,8 @@ const Dashboard = () => {
   }, [token]);
 
   useEffect(() => {
+    selectedIdRef.current = selectedDataset?.id ?? null;
+    setInsightsPolls(0);
     if (selectedDataset) {
       fetchAnalysis(selectedDataset.id);
     } else {
@@ -636,13 +664,32 @@ const Dashboard = () => {
     }
   }, [selectedDataset]);
 
+  // Keep polling while the selected dataset's insights are pending, up to a cap
+  useEffect(() => {
+    if (!selectedDataset || analysisData?.insights_status !== 'pending') return;
+    if (insightsPolls >= INSIGHTS_MAX_POLLS) return;
+    const timer = setTimeout(async () => {
+      await fetchAnalysis(selectedDataset.id, { poll: true });
+      if (selectedIdRef.current === selectedDataset.id) {
+        setInsightsPolls((polls) => polls + 1);
+      }
+    }, INSIGHTS_POLL_INTERVAL_MS);
+    return () => clearTimeout(timer);
+  }, [selectedDataset, analysisData, insightsPolls]);
+
   const handleUploadSuccess = (result) => {
     alert(`File processed successfully! Rows: ${result.rows}, Columns: ${result.columns}`);
     fetchDatasets(); // Refresh the list
   };
 
   const handleSelectDataset = (dataset) => {
-    setSelectedDataset(dataset);
+    if (dataset.id === selectedDataset?.id) {
+      // Same dataset again: the selection effect won't rerun, so refresh here
+      setInsightsPolls(0);
+      fetchAnalysis(dataset.id);
+    } else {
+      setSelectedDataset(dataset);
+    }
   };
 
   if (loading) {
@@ -718,7 +765,10 @@ const Dashboard = () => {
                       <p className="mt-2 text-gray-600">Loading analysis...</p>
                     </div>
                   ) : analysisData ? (
-                    <AnalysisDisplay analysis={analysisData} />
+                    <AnalysisDisplay
+                      analysis={analysisData}
+                      insightsTimedOut={insightsPolls >= INSIGHTS_MAX_POLLS}
+                    />
                   ) : (
                     <p className="text-gray-500 text-center py-8">No analysis data available</p>
                   )}